@@ -23,7 +23,10 @@ import torch
 import torchvision
 import torchvision.transforms as transforms
 
-def load_data(batch_size=128, num_workers=0):
+# import the GPU prefetch loader
+from dataloaders.prefetch_loader import fast_collate, PrefetchLoader
+
+def load_data(batch_size=256, num_workers=4, pin_memory=True, use_gpu_augment=False):
     '''
     Function loads the CIFAR-100 dataset and splits into
     train, validation and test sets.
@@ -31,13 +34,16 @@ def load_data(batch_size=128, num_workers=0):
     Inputs:
         batch_size - Int indicating the batch size. Default = 256
         num_workers - Int indicating the number of workers for loading
-            the data. Default = 0 (truly deterministic)
+            the data. Default = 4
+        pin_memory - Boolean indicating whether to return the batches in
+            pinned memory for faster transfers to the GPU. Default = True
+        use_gpu_augment - Boolean indicating whether to randomly crop and flip
+            the training images on the GPU. Default = False
     '''
 
-    # normalize the input
+    # keep the input as uint8, it is normalized on the GPU by the PrefetchLoader
     transform = transforms.Compose(
-    [transforms.ToTensor(),
-     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))])
+    [transforms.PILToTensor()])
 
     # load the training and test dataset
     trainset = torchvision.datasets.CIFAR100(root='./data/cifar100', train=True,
@@ -50,13 +56,32 @@ def load_data(batch_size=128, num_workers=0):
     test_split = len(testset) - val_split
     valset, testset = torch.utils.data.random_split(testset, [val_split, test_split])
 
+    # pin the batches
+    loader_kwargs = dict(
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        collate_fn=fast_collate
+    )
+
+    # keep the workers alive between epochs and prefetch more batches
+    # (only allowed when using multiprocessing)
+    if num_workers > 0:
+        loader_kwargs['persistent_workers'] = True
+        loader_kwargs['prefetch_factor'] = 4
+
     # create the dataloaders
     trainloader = torch.utils.data.DataLoader(trainset, batch_size=batch_size,
-                                          shuffle=True, num_workers=num_workers)
+                                          shuffle=True, **loader_kwargs)
     valloader = torch.utils.data.DataLoader(valset, batch_size=batch_size,
-                                            shuffle=False, num_workers=num_workers)
+                                            shuffle=False, **loader_kwargs)
     testloader = torch.utils.data.DataLoader(testset, batch_size=batch_size,
-                                                shuffle=False, num_workers=num_workers)
+                                                shuffle=False, **loader_kwargs)
+
+    # augment (training only) and normalize the batches on the GPU
+    trainloader = PrefetchLoader(trainloader, mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5),
+                                 augment=use_gpu_augment)
+    valloader = PrefetchLoader(valloader, mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5))
+    testloader = PrefetchLoader(testloader, mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5))
 
     # 100 classes for CIFAR-100
     num_classes = 100
@@ -23,7 +23,7 @@ import torch
 import torchvision
 import torchvision.transforms as transforms
 
-def load_data(batch_size=128, num_workers=0):
+def load_data(batch_size=128, num_workers=0, pin_memory=True):
     '''
     Function loads the CIFAR-10 dataset and splits into
     train, validation and test sets.
@@ -31,7 +31,9 @@ def load_data(batch_size=128, num_workers=0):
     Inputs:
         batch_size - Int indicating the batch size. Default = 256
         num_workers - Int indicating the number of workers for loading
-            the data. Default = 0 (truly deterministic)
+            the data. Default = 0
+        pin_memory - Boolean indicating whether to return the batches in
+            pinned memory for faster transfers to the GPU. Default = True
     '''
 
     # normalize the input
@@ -51,13 +53,23 @@ def load_data(batch_size=128, num_workers=0):
     test_split = len(testset) - val_split
     valset, testset = torch.utils.data.random_split(testset, [val_split, test_split])
 
+    # pin the batches
+    loader_kwargs = dict(
+        num_workers=num_workers,
+        pin_memory=pin_memory
+    )
+
+    # keep the workers alive between epochs (only allowed when using multiprocessing)
+    if num_workers > 0:
+        loader_kwargs['persistent_workers'] = True
+
     # create the dataloaders
     trainloader = torch.utils.data.DataLoader(trainset, batch_size=batch_size,
-                                            shuffle=True, num_workers=num_workers)
+                                            shuffle=True, **loader_kwargs)
     valloader = torch.utils.data.DataLoader(valset, batch_size=batch_size,
-                                            shuffle=False, num_workers=num_workers)
+                                            shuffle=False, **loader_kwargs)
     testloader = torch.utils.data.DataLoader(testset, batch_size=batch_size,
-                                                shuffle=False, num_workers=num_workers)
+                                                shuffle=False, **loader_kwargs)
 
     # 10 classes for CIFAR-10
     num_classes = 10
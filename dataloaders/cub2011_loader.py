@@ -33,7 +33,7 @@ from torchvision.datasets.utils import download_url
 from torch.utils.data import Dataset
 from torch.utils.data import DataLoader
 
-def load_data(batch_size=128, num_workers=0):
+def load_data(batch_size=128, num_workers=0, pin_memory=True):
     '''
     Function loads the CUB-200 dataset and splits into
     train, validation and test sets.
@@ -41,7 +41,9 @@ def load_data(batch_size=128, num_workers=0):
     Inputs:
         batch_size - Int indicating the batch size. Default = 256
         num_workers - Int indicating the number of workers for loading
-            the data. Default = 0 (truly deterministic)
+            the data. Default = 0
+        pin_memory - Boolean indicating whether to return the batches in
+            pinned memory for faster transfers to the GPU. Default = True
     '''
 
     # normalize the input
@@ -86,15 +88,25 @@ def load_data(batch_size=128, num_workers=0):
             test = not test
         index += 1
 
+    # pin the batches
+    loader_kwargs = dict(
+        num_workers=num_workers,
+        pin_memory=pin_memory
+    )
+
+    # keep the workers alive between epochs (only allowed when using multiprocessing)
+    if num_workers > 0:
+        loader_kwargs['persistent_workers'] = True
+
     # create the dataloaders
     trainloader = DataLoader(
-        train_set, batch_size=batch_size, num_workers=num_workers, shuffle=True
+        train_set, batch_size=batch_size, shuffle=True, **loader_kwargs
     )
     valloader = DataLoader(
-        val_set, batch_size=batch_size, shuffle=False, num_workers=num_workers
+        val_set, batch_size=batch_size, shuffle=False, **loader_kwargs
     )
     testloader = DataLoader(
-        test_set, batch_size=batch_size, shuffle=False, num_workers=num_workers
+        test_set, batch_size=batch_size, shuffle=False, **loader_kwargs
     )
 
     # 200 classes for CUB-200
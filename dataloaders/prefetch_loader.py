@@ -0,0 +1,185 @@
+###############################################################################
+# MIT License
+#
+# Copyright (c) 2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Authors: Luuk Kaandorp, Ward Pennink, Ramon Dijkstra, Reinier Bekkenutte
+# Date Created: 2020-01-08
+###############################################################################
+
+"""
+Helper functions that augment and normalize uint8 image batches on the GPU
+(adapted from the timm / NVIDIA APEX prefetch loader)
+"""
+
+# pytorch imports
+import torch
+import torch.nn.functional as F
+
+def fast_collate(batch):
+    '''
+    Function that collates a list of (uint8 image, label) pairs into a batch
+    without converting the images to float.
+
+    Inputs:
+        batch - List of (image, label) tuples. Image shape: [C, W, H]
+    Outputs:
+        images - Batch of uint8 images. Shape: [B, C, W, H]
+        targets - Batch of labels. Shape: [B]
+    '''
+
+    # stack the images and labels
+    images = torch.stack([sample[0] for sample in batch])
+    targets = torch.tensor([sample[1] for sample in batch], dtype=torch.int64)
+
+    # return the batch
+    return images, targets
+
+class PrefetchLoader:
+    """
+    Dataloader wrapper that moves uint8 batches to the GPU and normalizes them there
+    """
+
+    def __init__(self, loader, mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5), augment=False):
+        """
+        Wrapper around a dataloader that returns normalized float batches.
+
+        Inputs:
+            loader - DataLoader that returns uint8 image batches (see fast_collate).
+            mean - Tuple with the per channel mean in the [0, 1] range. Default = (0.5, 0.5, 0.5)
+            std - Tuple with the per channel standard deviation in the [0, 1] range.
+                Default = (0.5, 0.5, 0.5)
+            augment - Boolean indicating whether to apply a random crop (padding 4)
+                and random horizontal flip to the batches. Default = False
+        """
+
+        # save the inputs
+        self.loader = loader
+        self.augment = augment
+
+        # scale the statistics to the uint8 range
+        self.mean = torch.tensor([x * 255 for x in mean]).view(1, -1, 1, 1)
+        self.std = torch.tensor([x * 255 for x in std]).view(1, -1, 1, 1)
+
+    def __iter__(self):
+        """
+        Iterate over the normalized batches. When CUDA is available the next
+        batch is copied and normalized on a side stream while the current
+        batch is being processed.
+        """
+
+        # normalize on the CPU if there is no GPU available
+        if not torch.cuda.is_available():
+            for images, targets in self.loader:
+                if self.augment:
+                    images = self.random_crop_flip(images)
+                yield self.normalize(images, self.mean, self.std), targets
+            return
+
+        # move the statistics to the GPU
+        mean = self.mean.cuda()
+        std = self.std.cuda()
+
+        # prefetch the batches on a separate stream
+        stream = torch.cuda.Stream()
+        first = True
+        for next_images, next_targets in self.loader:
+            with torch.cuda.stream(stream):
+                next_images = next_images.cuda(non_blocking=True)
+                next_targets = next_targets.cuda(non_blocking=True)
+                if self.augment:
+                    next_images = self.random_crop_flip(next_images)
+                next_images = self.normalize(next_images, mean, std)
+
+            # return the previous batch while the next one is loading
+            if not first:
+                yield images, targets
+            else:
+                first = False
+
+            # wait for the next batch to be ready and mark it as used by the
+            # current stream, so its memory is not reused by the side stream
+            # while the current stream still reads it
+            torch.cuda.current_stream().wait_stream(stream)
+            next_images.record_stream(torch.cuda.current_stream())
+            next_targets.record_stream(torch.cuda.current_stream())
+            images = next_images
+            targets = next_targets
+
+        # return the last batch
+        if not first:
+            yield images, targets
+
+    def __len__(self):
+        """
+        Number of batches of the wrapped dataloader.
+        """
+        return len(self.loader)
+
+    @staticmethod
+    def normalize(images, mean, std):
+        """
+        Function that converts a batch of uint8 images to normalized floats.
+
+        Inputs:
+            images - Batch of uint8 images. Shape: [B, C, W, H]
+            mean - Per channel mean in the [0, 255] range. Shape: [1, C, 1, 1]
+            std - Per channel standard deviation in the [0, 255] range. Shape: [1, C, 1, 1]
+        Outputs:
+            images - Batch of normalized float images. Shape: [B, C, W, H]
+        """
+        return images.float().sub_(mean).div_(std)
+
+    @staticmethod
+    def random_crop_flip(images, padding=4):
+        """
+        Function that randomly crops (with zero padding) and horizontally flips
+        each image of a batch on the device of the batch.
+
+        Inputs:
+            images - Batch of images. Shape: [B, C, W, H]
+            padding - Int indicating the padding added before cropping. Default = 4
+        Outputs:
+            images - Batch of augmented images. Shape: [B, C, W, H]
+        """
+
+        # save the image dimensions for later use
+        B, _, H, W = images.shape
+        device = images.device
+
+        # flip half of the images horizontally
+        flip = torch.rand(B, device=device) < 0.5
+        images = torch.where(flip[:, None, None, None], images.flip(3), images)
+
+        # crop every padded image at its own random offset
+        padded = F.pad(images, [padding] * 4).permute(0, 2, 3, 1)
+        offset_h = torch.randint(0, 2 * padding + 1, (B, 1, 1), device=device)
+        offset_w = torch.randint(0, 2 * padding + 1, (B, 1, 1), device=device)
+        rows = offset_h + torch.arange(H, device=device).view(1, H, 1)
+        cols = offset_w + torch.arange(W, device=device).view(1, 1, W)
+        batch = torch.arange(B, device=device).view(B, 1, 1)
+        images = padded[batch, rows, cols].permute(0, 3, 1, 2)
+
+        # return the augmented batch
+        return images
+
+    @property
+    def dataset(self):
+        """
+        Property function to get the dataset of the wrapped dataloader
+        """
+        return self.loader.dataset
+
+    @property
+    def sampler(self):
+        """
+        Property function to get the sampler of the wrapped dataloader
+        """
+        return self.loader.sampler
@@ -22,8 +22,6 @@ Main training file
 import argparse
 import time
 import os
-from os import listdir
-from os.path import isfile, join
 
 # pytorch imports
 import torch
@@ -87,8 +85,9 @@ def train_model(args):
         args - Namespace object from the argument parser
     """
 
-    # anomaly detection in case of changing models
-    torch.autograd.set_detect_anomaly(False)
+    # anomaly detection in case of changing models (slows down training)
+    if args.debug:
+        torch.autograd.set_detect_anomaly(True)
 
     # print the most important arguments given by the user
     print('----- MODEL SUMMARY -----')
@@ -136,7 +135,6 @@ def train_model(args):
     pl.seed_everything(args.seed)
 
     # initialize the model
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     model = initialize_model(args.model, num_classes, args.lr, args.k)
 
     # load the pre-trained model if directory has been given
@@ -272,6 +270,8 @@ if __name__ == '__main__':
                         help='Seed to use for reproducing results. Default is 42.')
     parser.add_argument('--no_early_stopping', action='store_true',
                         help='Disable early stopping. Enabled by default.')
+    parser.add_argument('--debug', action='store_true',
+                        help='Enable autograd anomaly detection. Disabled by default.')
 
     # optimizer hyperparameters
     parser.add_argument('--lr', default=3e-4, type=float,
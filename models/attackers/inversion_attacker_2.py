@@ -27,7 +27,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import torchvision
 import pytorch_lightning as pl
 
 class UNet(pl.LightningModule):
@@ -35,7 +34,7 @@ class UNet(pl.LightningModule):
     Standard U-net model
     """
 
-    def __init__(self, generator=None, encoding_layer=None, enc_chs=(6,64,128,256,512), dec_chs=(512, 256, 128, 64), num_channels=3, retain_dim=True, out_sz=(32,32), lr=3e-4):
+    def __init__(self, generator=None, encoding_layer=None, enc_chs=(6,64,128,256,512), dec_chs=(512, 256, 128, 64), num_channels=3, retain_dim=True, out_sz=(32,32), lr=3e-4, residual_blocks=False):
         """
         Standard U-net network
 
@@ -50,6 +49,9 @@ class UNet(pl.LightningModule):
             retain_dim - Boolean indicating whether to retain the input dimension. Default = True
             out_sz - Tuple indicating the shape of the output size. Default = (32,32)
             lr - Learning rate to use for the optimizer. Default = 3e-4
+            residual_blocks - Boolean indicating whether to use the lighter two
+                convolution residual blocks instead of the six convolution blocks.
+                Default = False
         """
         super().__init__()
 
@@ -60,34 +62,59 @@ class UNet(pl.LightningModule):
         self.retain_dim = retain_dim
         self.lr = lr
 
-        # initialize first upsampling layer for the features
-        self.upsample = nn.Upsample(size=(32,32))
-
-        # check whether the GAN is initialized
+        # check whether the GAN is initialized and freeze it
         if self.gan is not None:
-            self.gan.requires_grad = False
+            self.gan.requires_grad_(False)
+            self.gan.eval()
 
-        # check whether the encoding layers are initialized
+        # check whether the encoding layers are initialized and freeze them
         if self.encoding_layer is not None:
-            self.encoding_layer.requires_grad = False
+            self.encoding_layer.requires_grad_(False)
+            self.encoding_layer.eval()
 
         # initialize the model layers
-        self.encoder = Encoder(enc_chs)
-        self.decoder = Decoder(dec_chs)
+        self.encoder = Encoder(enc_chs, residual_blocks)
+        self.decoder = Decoder(dec_chs, residual_blocks)
         self.head = nn.Conv2d(dec_chs[-1], num_channels, 1)
 
-        # initialize the loss function
-        self.loss_fn = nn.MSELoss(reduction='mean')
+        # use the channels last memory format for faster convolutions on the GPU
+        self.to(memory_format=torch.channels_last)
+
+    def train(self, mode=True):
+        """
+        Function to set the training mode of the model. The frozen GAN and
+        encoding layers always stay in evaluation mode, so their batch norm
+        statistics are not updated while training the attacker.
+
+        Inputs:
+            mode - Boolean indicating whether to set training mode. Default = True
+        """
+        super().train(mode)
+
+        # keep the frozen modules in evaluation mode
+        if self.gan is not None:
+            self.gan.eval()
+        if self.encoding_layer is not None:
+            self.encoding_layer.eval()
+
+        # return the model
+        return self
 
     def configure_optimizers(self):
         """
         Function to configure the optimizers
         """
-        # initialize optimizer for the entire model
-        model_optimizer = torch.optim.Adam(self.parameters(), lr=self.lr)
+        # initialize optimizer for the trainable (non-frozen) parameters
+        model_optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, self.parameters()), lr=self.lr)
+
+        # halve the learning rate when the validation loss stops improving
+        model_scheduler = {
+            'scheduler': torch.optim.lr_scheduler.ReduceLROnPlateau(model_optimizer, mode='min', factor=0.5, patience=1),
+            'monitor': 'val_loss'
+        }
 
-        # return the optimizer
-        return model_optimizer
+        # return the optimizer and scheduler
+        return [model_optimizer], [model_scheduler]
 
     def training_step(self, batch, optimizer_idx):
         """
@@ -113,14 +140,14 @@ class UNet(pl.LightningModule):
             x2 = self.encoding_layer(x)
 
         # run the batch through the layers
+        x2 = x2.contiguous(memory_format=torch.channels_last)
         enc_ftrs = self.encoder(x2)
-        out = self.decoder(enc_ftrs[::-1][0], enc_ftrs[::-1][1:])
+        out = self.decoder(enc_ftrs[0], enc_ftrs[1:])
         out = self.head(out)
-        if self.retain_dim:
-            out = F.interpolate(out, self.out_sz)
+        out = self.resize(out)
 
         # calculate the model loss
-        loss = self.loss_fn(out, x)
+        loss = F.mse_loss(out, x)
 
         # log the training loss
         self.log("train_loss", loss)
@@ -152,14 +179,14 @@ class UNet(pl.LightningModule):
             x2 = self.encoding_layer(x)
 
         # run the batch through the layers
+        x2 = x2.contiguous(memory_format=torch.channels_last)
         enc_ftrs = self.encoder(x2)
-        out = self.decoder(enc_ftrs[::-1][0], enc_ftrs[::-1][1:])
+        out = self.decoder(enc_ftrs[0], enc_ftrs[1:])
         out = self.head(out)
-        if self.retain_dim:
-            out = F.interpolate(out, self.out_sz)
+        out = self.resize(out)
 
         # calculate the model loss
-        loss = self.loss_fn(out, x)
+        loss = F.mse_loss(out, x)
 
         # log the validation loss
         self.log("val_loss", loss)
@@ -187,33 +214,31 @@ class UNet(pl.LightningModule):
         # get the images of the batch
         x, _ = batch
 
-        # run the image batch through the encoding layer
-        with torch.no_grad():
-            x2 = self.encoding_layer(x)
-
-        # run the image batch through the GAN
-        _, encoded_x, thetas, _, _ = self.gan(x)
-
-        # upsample both processed batches
-        encoded_x = self.upsample(encoded_x.real)
-        encoded_x2 = self.upsample(x2)
-
-        # run the batches through the layers
-        enc_ftrs = self.encoder(encoded_x)
-        enc_ftrs2 = self.encoder(encoded_x2)
-        out = self.decoder(enc_ftrs[::-1][0], enc_ftrs[::-1][1:])
-        out2 = self.decoder(enc_ftrs2[::-1][0], enc_ftrs2[::-1][1:])
+        # run the image batch through the GAN, which also returns the output
+        # of the encoding layer (non-obfuscated features)
+        # (outside of autocast, the complex features do not support half precision)
+        with torch.no_grad(), torch.cuda.amp.autocast(enabled=False):
+            x2, encoded_x, thetas, _, _ = self.gan(x.float())
+
+        # stack both processed batches and upsample them at once
+        # (nearest-neighbour, as used for the published attackers)
+        features = torch.cat([encoded_x.real, x2], dim=0)
+        if features.shape[-2:] != tuple(self.out_sz):
+            features = F.interpolate(features, self.out_sz, mode='nearest')
+
+        # run the stacked batches through the layers in a single pass
+        features = features.contiguous(memory_format=torch.channels_last)
+        enc_ftrs = self.encoder(features)
+        out = self.decoder(enc_ftrs[0], enc_ftrs[1:])
         out = self.head(out)
-        out2 = self.head(out2)
-        if self.retain_dim:
-            out = F.interpolate(out, self.out_sz)
-            out2 = F.interpolate(out2, self.out_sz)
+        out = self.resize(out)
+        out, out2 = out.chunk(2, dim=0)
 
         # calculate the model loss of the obfuscated features
-        obfuscated_loss = self.loss_fn(out, x)
+        obfuscated_loss = F.mse_loss(out, x)
 
         # calculate the model loss of the non-obfuscated features
-        non_obfuscated_loss = self.loss_fn(out2,x)
+        non_obfuscated_loss = F.mse_loss(out2, x)
 
         # log the losses
         self.log("Obfuscated - reconstruction_error", obfuscated_loss)
@@ -222,23 +247,47 @@ class UNet(pl.LightningModule):
         # return the losses
         return obfuscated_loss, non_obfuscated_loss
 
+    def resize(self, out):
+        """
+        Function that resizes the U-net output to the output size.
+
+        Inputs:
+            out - Batch of reconstructed images. Shape: [B, C, W, H]
+                B - batch size
+                C - channels per image
+                W- image width
+                H - image height
+        Outputs:
+			out - Batch of reconstructed images of the output size.
+        """
+
+        # only resample if the dimension should be retained and differs
+        # (bilinear; only reached when training on the 24x24 LeNet outputs,
+        # test outputs are already out_sz since the features are resized first)
+        if self.retain_dim and out.shape[-2:] != tuple(self.out_sz):
+            out = F.interpolate(out, self.out_sz, mode='bilinear', align_corners=False)
+
+        # return the resized output
+        return out
+
 class Encoder(nn.Module):
     """
     U-net encoder half
     """
 
-    def __init__(self, chs=(6,64,128,256,512,1024)):
+    def __init__(self, chs=(6,64,128,256,512,1024), residual_blocks=False):
         """
         Class for U-net encoder half.
 
         Inputs:
             chs - The channels of the block of the encoder.
                 Default = (6,64,128,256,512,1024)
+            residual_blocks - Boolean indicating whether to use residual blocks. Default = False
         """
         super().__init__()
 
         # initialize the layers of the U-net encoder
-        self.enc_blocks = nn.ModuleList([Block(chs[i], chs[i+1]) for i in range(len(chs)-1)])
+        self.enc_blocks = nn.ModuleList([Block(chs[i], chs[i+1], residual_blocks) for i in range(len(chs)-1)])
         self.pool = nn.MaxPool2d(2)
 
     def forward(self, x):
@@ -252,7 +301,7 @@ class Encoder(nn.Module):
                 W- feature width
                 H - feature height
         Outputs:
-			ftrs - Batch of compressed features.
+			ftrs - Batch of compressed features, deepest block first (decoder order).
         """
 
         # forward the batch through the Layers
@@ -262,21 +311,22 @@ class Encoder(nn.Module):
             ftrs.append(x)
             x = self.pool(x)
 
-        # return the compressed features
-        return ftrs
+        # return the compressed features in the order used by the decoder
+        return ftrs[::-1]
 
 class Decoder(nn.Module):
     """
     U-net decoder half
     """
 
-    def __init__(self, chs=(1024, 512, 256, 128, 64)):
+    def __init__(self, chs=(1024, 512, 256, 128, 64), residual_blocks=False):
         """
         Class for U-net decoder half.
 
         Inputs:
             chs - The channels of the block of the encoder.
                 Default = (1024, 512, 256, 128, 64)
+            residual_blocks - Boolean indicating whether to use residual blocks. Default = False
         """
         super().__init__()
 
@@ -285,7 +335,7 @@ class Decoder(nn.Module):
 
         # initialize the layers of the U-net decoder
         self.upconvs = nn.ModuleList([nn.ConvTranspose2d(chs[i], chs[i+1], 2, 2) for i in range(len(chs)-1)])
-        self.dec_blocks = nn.ModuleList([Block(chs[i], chs[i+1]) for i in range(len(chs)-1)])
+        self.dec_blocks = nn.ModuleList([Block(chs[i], chs[i+1], residual_blocks) for i in range(len(chs)-1)])
 
     def forward(self, x, encoder_features):
         """
@@ -303,11 +353,11 @@ class Decoder(nn.Module):
         """
 
         # forward the batch through the Layers
-        for i in range(len(self.chs)-1):
-            x = self.upconvs[i](x)
-            enc_ftrs = self.crop(encoder_features[i], x)
+        for upconv, dec_block, enc_ftrs in zip(self.upconvs, self.dec_blocks, encoder_features):
+            x = upconv(x)
+            enc_ftrs = self.crop(enc_ftrs, x)
             x = torch.cat([x, enc_ftrs], dim=1)
-            x = self.dec_blocks[i](x)
+            x = dec_block(x)
 
         # return the decoded features
         return x
@@ -327,9 +377,11 @@ class Decoder(nn.Module):
 			enc_features - Batch of cropped features.
         """
 
-        # crop the features
-        _, _, H, W = x.shape
-        enc_ftrs = torchvision.transforms.CenterCrop([H, W])(enc_ftrs)
+        # center crop the features with a slice
+        H, W = x.shape[-2], x.shape[-1]
+        dh = (enc_ftrs.shape[-2] - H) // 2
+        dw = (enc_ftrs.shape[-1] - W) // 2
+        enc_ftrs = enc_ftrs[..., dh:dh+H, dw:dw+W]
 
         # return the cropped features
         return enc_ftrs
@@ -339,30 +391,44 @@ class Block(nn.Module):
     U-net block
     """
 
-    def __init__(self, in_ch, out_ch):
+    def __init__(self, in_ch, out_ch, residual=False):
         """
         Class for U-net block.
 
         Inputs:
             in_ch - Int indicating the number of input channels.
             out_ch - Int indicating the number of output channels.
+            residual - Boolean indicating whether to use two convolutions with a
+                residual connection instead of six convolutions. Default = False
         """
         super().__init__()
 
+        # save the inputs
+        self.residual = residual
+
         # initialize the layers of the U-net block
-        self.layers = nn.Sequential(
-            nn.Conv2d(in_ch, out_ch, 3, padding=1),
-            nn.ReLU(),
-            nn.Conv2d(out_ch, out_ch, 3, padding=1),
-            nn.ReLU(),
-            nn.Conv2d(out_ch, out_ch, 3, padding=1),
-            nn.ReLU(),
-            nn.Conv2d(out_ch, out_ch, 3, padding=1),
-            nn.ReLU(),
-            nn.Conv2d(out_ch, out_ch, 3, padding=1),
-            nn.ReLU(),
-            nn.Conv2d(out_ch, out_ch, 3, padding=1)
-        )
+        # (scripted so the conv/ReLU stack runs without the Python module dispatch)
+        if self.residual:
+            self.layers = torch.jit.script(nn.Sequential(
+                nn.Conv2d(in_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1)
+            ))
+            self.skip = nn.Conv2d(in_ch, out_ch, 1)
+        else:
+            self.layers = torch.jit.script(nn.Sequential(
+                nn.Conv2d(in_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(out_ch, out_ch, 3, padding=1)
+            ))
 
     def forward(self, x):
         """
@@ -381,5 +447,9 @@ class Block(nn.Module):
         # the batch through the Layers
         out = self.layers(x)
 
+        # add the residual connection
+        if self.residual:
+            out = out + self.skip(x)
+
         # return the output
         return out
@@ -21,8 +21,6 @@ Main training for attacker file
 # basic imports
 import argparse
 import os
-from os import listdir
-from os.path import isfile, join
 
 # pytorch imports
 import torch
@@ -76,8 +74,13 @@ def train_model(args):
         args - Namespace object from the argument parser
     """
 
-    # anomaly detection in case of changing models
-    torch.autograd.set_detect_anomaly(False)
+    # allow TF32 tensor cores for the U-net convolutions and matmuls
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+
+    # anomaly detection in case of changing models (slows down training)
+    if args.debug:
+        torch.autograd.set_detect_anomaly(True)
 
     # print the most important arguments given by the user
     print('----- MODEL SUMMARY -----')
@@ -85,8 +88,10 @@ def train_model(args):
     print('Dataset: ' + args.dataset)
     print('Epochs: ' + str(args.epochs))
     print('K value: ' + str(args.k))
+    print('Residual blocks: ' + str(args.residual_blocks))
     print('Learning rate: ' + str(args.lr))
     print('Batch size: ' + str(args.batch_size))
+    print('Accumulated batches: ' + str(args.accumulate_grad_batches))
     print('Early stopping: ' + str(not args.no_early_stopping))
     print('Progress bar: ' + str(args.progress_bar))
     print('-------------------------')
@@ -96,21 +101,29 @@ def train_model(args):
 
     # load the data from the dataloader
     classes, trainloader, valloader, testloader = load_data_fn(
-        args.dataset, args.batch_size, args.num_workers
+        args.dataset, args.batch_size, args.num_workers, not args.no_pin_memory
     )
 
     # check whether to use early stopping
+    # (benchmark lets cuDNN autotune the fixed-size U-net convolutions,
+    # 16-bit precision runs them in mixed precision on the GPU)
     if args.no_early_stopping:
         # initialize the Lightning trainer
         trainer = pl.Trainer(default_root_dir=args.log_dir,
                         gpus=1 if torch.cuda.is_available() else 0,
                         max_epochs=args.epochs,
+                        accumulate_grad_batches=args.accumulate_grad_batches,
+                        benchmark=True,
+                        precision=16 if torch.cuda.is_available() else 32,
                         progress_bar_refresh_rate=1 if args.progress_bar else 0)
     else:
         # initialize the Lightning trainer
         trainer = pl.Trainer(default_root_dir=args.log_dir,
                         gpus=1 if torch.cuda.is_available() else 0,
                         max_epochs=args.epochs,
+                        accumulate_grad_batches=args.accumulate_grad_batches,
+                        benchmark=True,
+                        precision=16 if torch.cuda.is_available() else 32,
                         progress_bar_refresh_rate=1 if args.progress_bar else 0,
                         callbacks=[stop_criteria])
     trainer.logger._default_hp_metric = None
@@ -119,13 +132,13 @@ def train_model(args):
     pl.seed_everything(args.seed)
 
     # initialize the model
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     gan_model = initialize_gan_model(args.gan_model, classes, args.lr, args.k)
     gan_model.load_state_dict(torch.load(args.load_gan))
     generator = gan_model.encoder.generator
     conv = gan_model.encoder.generator.encoding_layer
     enc_channels = unet_shapes(args.gan_model)
-    model = UNet(generator=generator, enc_chs=enc_channels, lr=args.lr, encoding_layer=conv)
+    model = UNet(generator=generator, enc_chs=enc_channels, lr=args.lr, encoding_layer=conv,
+                 residual_blocks=args.residual_blocks)
 
     # train the model
     print("Started training...")
@@ -167,19 +180,20 @@ def initialize_gan_model(model='Complex_LeNet', num_classes=10, lr=3e-4, k=2):
     else:
         assert False, "Unknown model name \"%s\". Available models are: %s" % (model, str(gan_model_dict.keys()))
 
-def load_data_fn(dataset='CIFAR-10', batch_size=256, num_workers=0):
+def load_data_fn(dataset='CIFAR-10', batch_size=256, num_workers=4, pin_memory=True):
     """
     Function for loading a dataset based on the given command line arguments.
 
     Inputs:
         dataset - String indicating the dataset to use. Default = 'CIFAR-10'
         batch_size - Int indicating the size of the mini batches. Default = 256
-        num_workers - Int indicating the number of workers to use in the dataloader. Default = 0 (truly deterministic)
+        num_workers - Int indicating the number of workers to use in the dataloader. Default = 4
+        pin_memory - Boolean indicating whether to use pinned memory in the dataloader. Default = True
     """
 
     # load the dataset if possible
     if dataset in dataset_dict:
-        return dataset_dict[dataset](batch_size, num_workers)
+        return dataset_dict[dataset](batch_size, num_workers, pin_memory)
     # alert the user if the given dataset does not exist
     else:
         assert False, "Unknown dataset name \"%s\". Available datasets are: %s" % (dataset, str(dataset_dict.keys()))
@@ -219,12 +233,20 @@ if __name__ == '__main__':
     # dataloader hyperparameters
     parser.add_argument('--batch_size', default=64, type=int,
                         help='Minibatch size. Default is 64.')
-    parser.add_argument('--num_workers', default=0, type=int,
-                        help='Number of workers to use in the data loaders. Default is not 0 (truly deterministic).')
+    parser.add_argument('--num_workers', default=4, type=int,
+                        help='Number of workers to use in the data loaders. Default is 4.')
+    parser.add_argument('--no_pin_memory', action='store_true',
+                        help='Disable pinned memory in the data loaders. Enabled by default.')
+
+    # attacker hyperparameters
+    parser.add_argument('--residual_blocks', action='store_true',
+                        help='Use two convolution residual blocks in the U-net instead of six convolution blocks. Disabled by default.')
 
     # training hyperparameters
     parser.add_argument('--epochs', default=10, type=int,
                         help='Max number of epochs. Default is 10.')
+    parser.add_argument('--accumulate_grad_batches', default=4, type=int,
+                        help='Number of batches to accumulate the gradients over before each optimizer step. Default is 4.')
     parser.add_argument('--k', default=2, type=int,
                         help='Level of anonimity to use during training. k-1 fake features are generated to train the encoder. Default is 2,')
     parser.add_argument('--log_dir', default='attacker_logs/', type=str,
@@ -237,6 +259,8 @@ if __name__ == '__main__':
                         help='Seed to use for reproducing results. Default is 42.')
     parser.add_argument('--no_early_stopping', action='store_true',
                         help='Disable early stopping. Enabled by default.')
+    parser.add_argument('--debug', action='store_true',
+                        help='Enable autograd anomaly detection. Disabled by default.')
 
     # optimizer hyperparameters
     parser.add_argument('--lr', default=3e-4, type=float,